@@ -5,10 +5,15 @@ Handles database operations for gold price tracking using httpx directly
 to Supabase REST API (no supabase-py dependency needed).
 """
 import os
+import asyncio
 import logging
+from collections import Counter
 from datetime import datetime, date, timedelta
 from typing import Optional, Any
 import httpx
+import orjson
+
+from models import GoldPrice
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +22,62 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
 
+# Shared HTTP client, reused so connections to Supabase stay alive
+# (HTTP/2 multiplexes concurrent requests over a single connection)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared Supabase HTTP client (created on first use)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=300,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared Supabase HTTP client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Supabase API headers, built once (treat as read-only)
+_HEADERS = {
+    "apikey": SUPABASE_KEY,
+    "Authorization": f"Bearer {SUPABASE_KEY}",
+    "Content-Type": "application/json",
+    "Prefer": "return=representation",
+}
+_UPSERT_HEADERS = {
+    **_HEADERS,
+    "Prefer": "resolution=merge-duplicates,return=representation",
+}
+# Merge on the (vendor, weight, price_date) unique index rather than the
+# id primary key, so a re-sync on the same day updates that day's rows
+_UPSERT_PARAMS = {"on_conflict": "vendor,weight,price_date"}
+
+
 def get_headers() -> dict:
-    """Get Supabase API headers"""
-    return {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=representation",
-    }
+    """Get Supabase API headers (shared dict, do not mutate)"""
+    return _HEADERS
+
+
+# Price trends ordered by sign of the change (down, no change, up)
+TRENDS = ("down", "stable", "up")
+
+# Columns returned to API clients (matches PriceHistoryItem / PriceChange)
+PRICE_COLUMNS = "vendor,weight,selling_price,buyback_price,price_date,source"
+CHANGE_COLUMNS = "vendor,weight,previous_price,current_price,change_amount,change_percent,trend,price_date"
 
 
 def get_rest_url(table: str) -> str:
@@ -32,18 +85,66 @@ def get_rest_url(table: str) -> str:
     return f"{SUPABASE_URL}/rest/v1/{table}"
 
 
-async def save_prices(prices: list[dict], price_date: Optional[date] = None) -> dict:
+def get_rpc_url(function: str) -> str:
+    """Get Supabase REST URL for a Postgres function (RPC)"""
+    return f"{SUPABASE_URL}/rest/v1/rpc/{function}"
+
+
+def _in_filter(values) -> str:
+    """Build a PostgREST ``in.(...)`` filter, quoting each value"""
+    quoted = ",".join(
+        '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for value in values
+    )
+    return f"in.({quoted})"
+
+
+def _build_change_record(
+    vendor: str,
+    weight: float,
+    previous_price: int,
+    current_price: int,
+    price_date: str
+) -> dict:
+    """Build a price_changes record from previous and current price (price_date in ISO format)"""
+    change_amount = current_price - previous_price
+    change_percent = round((change_amount / previous_price) * 100, 2) if previous_price else 0
+    
+    # Sign of the change (-1, 0, 1) indexes straight into TRENDS
+    trend = TRENDS[(change_amount > 0) - (change_amount < 0) + 1]
+    
+    return {
+        "vendor": vendor,
+        "weight": weight,
+        "price_date": price_date,
+        "previous_price": previous_price,
+        "current_price": current_price,
+        "change_amount": change_amount,
+        "change_percent": change_percent,
+        "trend": trend,
+    }
+
+
+async def save_prices(prices: list[GoldPrice], price_date: Optional[date] = None) -> dict:
     """
     Save gold prices to database.
     Also calculates and saves price changes.
     
+    All prices are upserted in a single request while previous day's prices
+    are fetched concurrently with one batched query, and the resulting
+    changes are inserted in a single request, so a sync costs 2 sequential
+    round-trips regardless of size.
+    
     Args:
-        prices: List of price dicts with vendor, weight, selling_price, buyback_price
+        prices: List of scraped GoldPrice objects
         price_date: Date for the prices (defaults to today)
         
     Returns:
-        Summary of saved/updated records
+        Summary of saved/updated records, with an "error" key if the save failed
     """
+    # Drop invalid rows up front so only valid ones reach the request body
+    prices = [p for p in prices if p.vendor and p.weight > 0]
+    
     if not prices:
         return {"saved": 0, "updated": 0, "changes": 0}
     
@@ -51,128 +152,121 @@ async def save_prices(prices: list[dict], price_date: Optional[date] = None) ->
         raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
     
     target_date = price_date or date.today()
+    target_iso = target_date.isoformat()
+    previous_iso = (target_date - timedelta(days=1)).isoformat()
+    
+    records = [
+        {
+            "vendor": p.vendor,
+            "weight": p.weight,
+            "selling_price": p.selling_price,
+            "buyback_price": p.buyback_price,
+            "price_date": target_iso,
+            "source": "galeri24",
+        }
+        for p in prices
+    ]
     
-    saved = 0
     changes_recorded = 0
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for price in prices:
-            try:
-                vendor = price.get("vendor")
-                weight = float(price.get("weight", 0))
-                selling_price = price.get("selling_price")
-                buyback_price = price.get("buyback_price")
-                
-                if not vendor or weight <= 0:
-                    continue
-                
-                # Prepare record
-                record = {
-                    "vendor": vendor,
-                    "weight": weight,
-                    "selling_price": selling_price,
-                    "buyback_price": buyback_price,
-                    "price_date": target_date.isoformat(),
-                    "source": "galeri24",
-                }
-                
-                # Upsert using POST with on_conflict
-                url = get_rest_url("gold_prices")
-                headers = get_headers()
-                headers["Prefer"] = "resolution=merge-duplicates,return=representation"
-                
-                response = await client.post(url, json=record, headers=headers)
-                
-                if response.status_code in [200, 201]:
-                    saved += 1
-                    
-                    # Calculate and save price change
-                    change = await calculate_and_save_change(
-                        client, vendor, weight, selling_price, target_date
-                    )
-                    if change:
-                        changes_recorded += 1
-                else:
-                    logger.warning(f"Failed to save {vendor}: {response.status_code}")
-                        
-            except Exception as e:
-                logger.warning(f"Error saving price for {price.get('vendor')}: {e}")
-                continue
+    client = get_client()
+    
+    # All of previous day's prices in one query
+    params = {
+        "price_date": f"eq.{previous_iso}",
+        "vendor": _in_filter(sorted({r["vendor"] for r in records})),
+        "weight": _in_filter(sorted({r["weight"] for r in records})),
+        "select": "vendor,weight,selling_price",
+    }
+    
+    # Bulk upsert (PostgREST accepts a JSON array body) and the lookup are
+    # independent, so run them concurrently. Both are awaited to completion
+    # so a failure in one never leaves the other running unobserved
+    response, previous_response = await asyncio.gather(
+        client.post(
+            get_rest_url("gold_prices"),
+            params=_UPSERT_PARAMS,
+            content=orjson.dumps(records),
+            headers=_UPSERT_HEADERS,
+        ),
+        client.get(get_rest_url("gold_prices"), params=params, headers=get_headers()),
+        return_exceptions=True,
+    )
+    
+    # Only a failed upsert fails the sync
+    if isinstance(response, BaseException):
+        raise response
+    
+    # 42P10: the unique index migration has not run yet, so there is no
+    # conflict target - fall back to the plain upsert on the primary key
+    if response.status_code == 400 and b"42P10" in response.content:
+        logger.warning("Unique index ix_gold_prices_v_w_d missing, upserting without on_conflict")
+        response = await client.post(
+            get_rest_url("gold_prices"),
+            content=orjson.dumps(records),
+            headers=_UPSERT_HEADERS,
+        )
+    
+    if response.status_code not in [200, 201]:
+        logger.warning(f"Failed to save prices: {response.status_code}")
+        return {
+            "saved": 0,
+            "updated": 0,
+            "changes": 0,
+            "error": f"Failed to save prices: {response.status_code}",
+        }
+    
+    saved = len(records)
+    
+    # A failed lookup means no changes are recorded, as with a non-200 reply
+    previous_prices = {}
+    if isinstance(previous_response, BaseException):
+        logger.warning(f"Failed to fetch previous prices: {previous_response!r}")
+    elif previous_response.status_code == 200:
+        for row in orjson.loads(previous_response.content):
+            previous_prices[(row["vendor"], float(row["weight"]))] = row.get("selling_price")
+    else:
+        logger.warning(f"Failed to fetch previous prices: {previous_response.status_code}")
+    
+    # Calculate all changes locally
+    change_records = []
+    for record in records:
+        current_price = record["selling_price"]
+        previous_price = previous_prices.get((record["vendor"], record["weight"]))
+        if current_price is None or previous_price is None:
+            continue
+        
+        change_records.append(_build_change_record(
+            record["vendor"], record["weight"], previous_price, current_price, target_iso
+        ))
+    
+    if change_records:
+        response = await client.post(
+            get_rest_url("price_changes"), content=orjson.dumps(change_records), headers=get_headers()
+        )
+        if response.status_code in [200, 201]:
+            changes_recorded = len(change_records)
+        else:
+            logger.warning(f"Failed to save price changes: {response.status_code}")
     
     logger.info(f"Saved {saved} prices, recorded {changes_recorded} changes")
     return {"saved": saved, "updated": 0, "changes": changes_recorded}
 
 
-async def calculate_and_save_change(
-    client: httpx.AsyncClient,
-    vendor: str,
-    weight: float,
-    current_price: Optional[int],
-    price_date: date
-) -> Optional[dict]:
+async def fetch_rows(table: str, params: dict[str, Any]) -> list[dict]:
     """
-    Calculate price change from previous day and save to price_changes table.
+    GET rows from a table, returning [] on error.
+    
+    The body is streamed and decoded from raw bytes with orjson, and
+    error bodies are never read.
     """
-    if current_price is None:
-        return None
-    
-    previous_date = price_date - timedelta(days=1)
-    
-    try:
-        # Get previous day's price
-        url = get_rest_url("gold_prices")
-        params = {
-            "vendor": f"eq.{vendor}",
-            "weight": f"eq.{weight}",
-            "price_date": f"eq.{previous_date.isoformat()}",
-            "select": "selling_price",
-            "limit": "1",
-        }
-        
-        response = await client.get(url, params=params, headers=get_headers())
-        
-        if response.status_code != 200 or not response.json():
-            return None
-        
-        data = response.json()
-        if not data:
-            return None
-        
-        previous_price = data[0].get("selling_price")
-        if previous_price is None:
-            return None
-        
-        # Calculate change
-        change_amount = current_price - previous_price
-        change_percent = round((change_amount / previous_price) * 100, 2) if previous_price else 0
-        
-        if change_amount > 0:
-            trend = "up"
-        elif change_amount < 0:
-            trend = "down"
-        else:
-            trend = "stable"
-        
-        # Save price change
-        change_record = {
-            "vendor": vendor,
-            "weight": weight,
-            "price_date": price_date.isoformat(),
-            "previous_price": previous_price,
-            "current_price": current_price,
-            "change_amount": change_amount,
-            "change_percent": change_percent,
-            "trend": trend,
-        }
-        
-        change_url = get_rest_url("price_changes")
-        await client.post(change_url, json=change_record, headers=get_headers())
-        
-        return change_record
-        
-    except Exception as e:
-        logger.warning(f"Error calculating change for {vendor} {weight}g: {e}")
-        return None
+    client = get_client()
+    url = get_rest_url(table)
+    
+    async with client.stream("GET", url, params=params, headers=get_headers()) as response:
+        if response.status_code != 200:
+            return []
+        return orjson.loads(await response.aread())
 
 
 async def get_price_history(
@@ -190,7 +284,7 @@ async def get_price_history(
     
     params: dict[str, Any] = {
         "price_date": f"gte.{start_date}",
-        "select": "*",
+        "select": PRICE_COLUMNS,
         "order": "price_date.desc",
     }
     
@@ -200,13 +294,7 @@ async def get_price_history(
     if weight:
         params["weight"] = f"eq.{weight}"
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        url = get_rest_url("gold_prices")
-        response = await client.get(url, params=params, headers=get_headers())
-        
-        if response.status_code == 200:
-            return response.json()
-        return []
+    return await fetch_rows("gold_prices", params)
 
 
 async def get_price_changes(
@@ -224,7 +312,7 @@ async def get_price_changes(
     
     params: dict[str, Any] = {
         "price_date": f"eq.{target_date.isoformat()}",
-        "select": "*",
+        "select": CHANGE_COLUMNS,
         "order": "change_percent.desc",
     }
     
@@ -234,13 +322,7 @@ async def get_price_changes(
     if trend:
         params["trend"] = f"eq.{trend}"
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        url = get_rest_url("price_changes")
-        response = await client.get(url, params=params, headers=get_headers())
-        
-        if response.status_code == 200:
-            return response.json()
-        return []
+    return await fetch_rows("price_changes", params)
 
 
 async def get_latest_prices(vendor: Optional[str] = None) -> list[dict]:
@@ -254,50 +336,67 @@ async def get_latest_prices(vendor: Optional[str] = None) -> list[dict]:
     
     params: dict[str, Any] = {
         "price_date": f"eq.{today}",
-        "select": "*",
+        "select": PRICE_COLUMNS,
         "order": "vendor,weight",
     }
     
     if vendor:
         params["vendor"] = f"ilike.*{vendor}*"
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        url = get_rest_url("gold_prices")
-        response = await client.get(url, params=params, headers=get_headers())
-        
-        if response.status_code == 200:
-            return response.json()
-        return []
+    return await fetch_rows("gold_prices", params)
 
 
 async def get_trend_summary(days: int = 7) -> dict:
     """
     Get summary of price trends over the last N days.
+    
+    Counts are aggregated in Postgres by the ``trend_summary`` function
+    (see supabase/migrations). Falls back to counting rows here when the
+    function is not installed yet. The window starts from this server's
+    date in both cases, like the other price_date filters.
     """
     if not SUPABASE_URL or not SUPABASE_KEY:
         return {"up": 0, "down": 0, "stable": 0, "total": 0}
     
     start_date = (date.today() - timedelta(days=days)).isoformat()
     
+    client = get_client()
+    url = get_rpc_url("trend_summary")
+    response = await client.post(url, content=orjson.dumps({"start_date": start_date}), headers=get_headers())
+    
+    if response.status_code == 404:
+        logger.warning("trend_summary function not found, counting trends client-side")
+        return await _count_trends(client, start_date)
+    
+    if response.status_code != 200:
+        return {"up": 0, "down": 0, "stable": 0, "total": 0}
+    
+    data = orjson.loads(response.content)
+    row = data[0] if data else {}
+    
+    return {
+        "up": row.get("up") or 0,
+        "down": row.get("down") or 0,
+        "stable": row.get("stable") or 0,
+        "total": row.get("total") or 0,
+    }
+
+
+async def _count_trends(client: httpx.AsyncClient, start_date: str) -> dict:
+    """Count trends from raw price_changes rows since start_date (fallback for get_trend_summary)"""
     params = {
         "price_date": f"gte.{start_date}",
         "select": "trend",
     }
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        url = get_rest_url("price_changes")
-        response = await client.get(url, params=params, headers=get_headers())
-        
-        if response.status_code != 200:
-            return {"up": 0, "down": 0, "stable": 0, "total": 0}
-        
-        data = response.json()
-        
-        trends = {"up": 0, "down": 0, "stable": 0}
-        for record in data:
-            trend = record.get("trend")
-            if trend in trends:
-                trends[trend] += 1
-        
-        trends["total"] = sum(trends.values())
-        return trends
+    url = get_rest_url("price_changes")
+    response = await client.get(url, params=params, headers=get_headers())
+    
+    if response.status_code != 200:
+        return {"up": 0, "down": 0, "stable": 0, "total": 0}
+    
+    counts = Counter(record.get("trend") for record in orjson.loads(response.content))
+    
+    trends = {"up": counts["up"], "down": counts["down"], "stable": counts["stable"]}
+    trends["total"] = sum(trends.values())
+    return trends
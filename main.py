@@ -7,29 +7,35 @@ Built with FastAPI + Swagger UI + Supabase.
 Author: Generated with Claude AI
 """
 import os
+import asyncio
+import gzip
+import hashlib
 import logging
+import time
+from email.utils import formatdate
 from datetime import datetime, date
-from typing import Optional
+from typing import Iterator, Optional
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import Response
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from dotenv import load_dotenv
+from cachetools import TTLCache
+from pydantic import TypeAdapter
+import orjson
 
 from models import (
+    GoldPrice,
     PriceResponse,
     VendorResponse,
     InfoResponse,
     HealthResponse,
     ErrorResponse,
-    MetaInfo,
     PriceChangeResponse,
-    PriceChange,
     PriceHistoryResponse,
-    PriceHistoryItem,
     TrendResponse,
-    TrendSummary,
     SyncResponse,
 )
 from scraper import (
@@ -38,6 +44,8 @@ from scraper import (
     get_available_vendors,
     clear_cache,
     set_cache_ttl,
+    get_scrape_generation,
+    close_http_client,
 )
 from rss import (
     generate_rss_feed,
@@ -54,12 +62,28 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
+# Skip the multiprocessing lookup on every log record
+logging.logMultiprocessing = False
 
 # Configuration
 CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+# Public origin used in feed self-links (e.g. https://emas.example.com)
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
 
 # Check if Supabase is configured
 SUPABASE_ENABLED = bool(os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY"))
+SUPABASE_DISABLED_DETAIL = "Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY."
+
+# Imported after load_dotenv() since database reads its config at import
+if SUPABASE_ENABLED:
+    from database import (
+        save_prices,
+        get_price_history,
+        get_price_changes as fetch_price_changes,
+        get_trend_summary,
+        get_client,
+        close_client,
+    )
 
 
 @asynccontextmanager
@@ -68,9 +92,10 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Lacak Emas API...")
     set_cache_ttl(CACHE_TTL)
-    logger.info(f"Cache TTL set to {CACHE_TTL} seconds")
+    logger.info("Cache TTL set to %s seconds", CACHE_TTL)
     
     if SUPABASE_ENABLED:
+        get_client()
         logger.info("Supabase integration enabled")
     else:
         logger.warning("Supabase not configured - history/changes features disabled")
@@ -80,6 +105,10 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down Lacak Emas API...")
     clear_cache()
+    await close_http_client()
+    
+    if SUPABASE_ENABLED:
+        await close_client()
 
 
 # Initialize FastAPI app
@@ -124,14 +153,321 @@ GET /prices/history?days=7     # History 7 hari
     ]
 )
 
+# Static CORS headers, pre-encoded for the ASGI layer
+_CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+_CORS_PREFLIGHT_HEADERS = _CORS_HEADERS + [
+    (b"access-control-allow-methods", b"*"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-max-age", b"600"),
+]
+
+
+def _is_preflight(scope) -> bool:
+    """Check for both the Origin and Access-Control-Request-Method headers"""
+    names = {name for name, _ in scope["headers"]}
+    return b"origin" in names and b"access-control-request-method" in names
+
+
+class StaticCORSMiddleware:
+    """
+    Allow any origin with fixed headers.
+    
+    The API is public and read-only, so there is no per-origin matching
+    and no credentials (which browsers reject alongside a `*` origin).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Only a real preflight is answered here; a plain OPTIONS goes to the router
+        if scope["method"] == "OPTIONS" and _is_preflight(scope):
+            await send({"type": "http.response.start", "status": 204, "headers": _CORS_PREFLIGHT_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + _CORS_HEADERS
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cors)
+
+
+class StrictGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that honours q-values and keeps a single Vary: Accept-Encoding.
+    
+    The stock middleware substring-matches "gzip", so "gzip;q=0" would
+    still be compressed; a refused gzip is hidden from it instead. Feed
+    responses set Vary themselves, and the stock middleware appends
+    another copy when it passes a large identity body through.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            if "gzip" in accept_encoding and not accepts_gzip(accept_encoding):
+                scope = dict(scope, headers=[
+                    (name, value) for name, value in scope["headers"] if name != b"accept-encoding"
+                ])
+        
+        async def send_with_vary(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                vary = headers.get("vary")
+                if vary:
+                    headers["vary"] = ", ".join(dict.fromkeys(v.strip() for v in vary.split(",")))
+            await send(message)
+        
+        await super().__call__(scope, receive, send_with_vary)
+
+
 # Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(StaticCORSMiddleware)
+
+# Compress larger JSON/XML responses
+app.add_middleware(StrictGZipMiddleware, minimum_size=500, compresslevel=5)
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+# Serializes price lists straight to JSON bytes in pydantic-core
+GOLD_PRICE_LIST = TypeAdapter(list[GoldPrice])
+
+
+# In-flight scrapes, keyed by (use_cache, cache_ttl)
+_scrape_inflight: dict[tuple[bool, int], asyncio.Task] = {}
+
+
+async def coalesced_scrape(use_cache: bool = True, cache_ttl: int = CACHE_TTL) -> list[GoldPrice]:
+    """scrape_galeri24() shared by concurrent callers, so a cache miss fetches once"""
+    key = (use_cache, cache_ttl)
+    task = _scrape_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(scrape_galeri24(use_cache=use_cache, cache_ttl=cache_ttl))
+        _scrape_inflight[key] = task
+        task.add_done_callback(lambda _: _scrape_inflight.pop(key, None))
+    # Shielded so one disconnecting client doesn't cancel the others' scrape
+    return await asyncio.shield(task)
+
+
+# Filtered price lists and rendered feeds, keyed by scrape generation so
+# they are rebuilt only after a fresh scrape
+_filter_cache: TTLCache = TTLCache(maxsize=256, ttl=CACHE_TTL)
+_feed_cache: TTLCache = TTLCache(maxsize=256, ttl=CACHE_TTL)
+
+
+def get_filtered_prices(
+    prices: list[GoldPrice],
+    vendor: Optional[str] = None,
+    weight: Optional[float] = None,
+    min_weight: Optional[float] = None,
+    max_weight: Optional[float] = None,
+) -> list[GoldPrice]:
+    """filter_prices() memoized per scrape generation (cached prices only)"""
+    cache_key = (get_scrape_generation(), vendor, weight, min_weight, max_weight)
+    filtered = _filter_cache.get(cache_key)
+    if filtered is None:
+        filtered = filter_prices(
+            prices,
+            vendor=vendor,
+            weight=weight,
+            min_weight=min_weight,
+            max_weight=max_weight,
+        )
+        _filter_cache[cache_key] = filtered
+    return filtered
+
+
+# Current local time as ISO string, reformatted at most once per second
+_iso_cache = ["", 0]
+
+
+def now_iso() -> str:
+    """Return the current local time (second precision) in ISO format"""
+    t = int(time.time())
+    if t != _iso_cache[1]:
+        _iso_cache[0] = datetime.fromtimestamp(t).isoformat()
+        _iso_cache[1] = t
+    return _iso_cache[0]
+
+
+FEED_CACHE_CONTROL = "public, max-age=60"
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Check an Accept-Encoding value for gzip (or *) with a non-zero q-value"""
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.strip().lower()] = q
+    if "gzip" in qvalues:
+        return qvalues["gzip"] > 0
+    return qvalues.get("*", 0) > 0
+
+
+def feed_response(request: Request, cached: tuple, media_type: str) -> Response:
+    """Serve a cached feed, using its pre-compressed body when the client accepts gzip"""
+    content, gzipped, total, etag, last_modified = cached
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": FEED_CACHE_CONTROL,
+        # Identity and gzip bodies share the ETag, so every reply (304s too) varies
+        "Vary": "Accept-Encoding",
+    }
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    headers["X-Total-Items"] = str(total)
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        # GZipMiddleware leaves responses with Content-Encoding untouched
+        headers["Content-Encoding"] = "gzip"
+        content = gzipped
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def build_feed_entry(xml: str, total: int, etag: Optional[str] = None) -> tuple:
+    """Encode, compress and tag a rendered feed for the feed cache"""
+    content = xml.encode()
+    return (
+        content,
+        gzip.compress(content, compresslevel=6),
+        total,
+        etag or compute_etag(content),
+        formatdate(usegmt=True),
+    )
+
+
+# Pre-serialized empty /prices body, refreshed when now_iso() ticks
+_empty_price_bodies: dict[tuple[str, bool], bytes] = {}
+
+
+def empty_price_body(cached: bool) -> bytes:
+    """Return the JSON body of a /prices response with no data"""
+    key = (now_iso(), cached)
+    body = _empty_price_bodies.get(key)
+    if body is None:
+        _empty_price_bodies.clear()
+        body = orjson.dumps({
+            "success": True,
+            "data": [],
+            "meta": {**_meta(0), "cached": cached},
+            "error": None,
+        })
+        _empty_price_bodies[key] = body
+    return body
+
+
+def _meta(total: int) -> dict:
+    """MetaInfo for database-backed responses, as a plain dict"""
+    return {
+        "source": "galeri24.co.id",
+        "scraped_at": now_iso(),
+        "total": total,
+        "cached": False,
+    }
+
+
+def _coerce_change(c: dict) -> dict:
+    """Coerce a price_changes row to the PriceChange shape in place"""
+    c["weight"] = float(c["weight"])
+    c["change_percent"] = float(c["change_percent"]) if c.get("change_percent") else None
+    if not c.get("trend"):
+        c["trend"] = "stable"
+    return c
+
+
+def _coerce_history(h: dict) -> dict:
+    """Coerce a gold_prices row to the PriceHistoryItem shape in place"""
+    h["weight"] = float(h["weight"])
+    if not h.get("source"):
+        h["source"] = "galeri24"
+    return h
+
+
+def iter_feed_items(prices: list[GoldPrice]) -> Iterator[dict]:
+    """Yield the price fields used by the feed generators, one item at a time"""
+    for p in prices:
+        yield {
+            "vendor": p.vendor,
+            "weight": p.weight,
+            "selling_price": p.selling_price,
+            "buyback_price": p.buyback_price,
+            "date": p.date,
+        }
+
+
+def get_feed_url(request: Request) -> str:
+    """Feed self-link; built from raw scope values when PUBLIC_BASE_URL is set"""
+    if not PUBLIC_BASE_URL:
+        return str(request.url)
+    query = request.scope["query_string"].decode("latin-1")
+    path = request.scope["path"]
+    return f"{PUBLIC_BASE_URL}{path}?{query}" if query else f"{PUBLIC_BASE_URL}{path}"
+
+
+def compute_etag(payload: bytes) -> str:
+    """Compute a weak ETag from a serialized payload"""
+    return f'W/"{hashlib.md5(payload).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check whether the client's If-None-Match already matches the ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [
+        tag.strip() for tag in if_none_match.split(",")
+    ]
+
+
+# Static response bodies, serialized once at import
+INFO_BODY = InfoResponse(
+    app_name="Lacak Emas API",
+    version="2.0.0",
+    status="running",
+    description="REST API untuk mendapatkan harga emas dari Galeri24 dengan tracking perubahan harga",
+    source="galeri24.co.id",
+    endpoints={
+        "GET /": "Interactive API documentation (Swagger)",
+        "GET /info": "API information",
+        "GET /health": "Health check",
+        "GET /prices": "Get gold prices with optional filters",
+        "GET /prices/changes": "Get price changes (up/down/stable)",
+        "GET /prices/history": "Get price history",
+        "GET /prices/trend": "Get trend summary",
+        "POST /prices/sync": "Sync prices to database",
+        "GET /feed/rss": "RSS feed of current prices",
+        "GET /feed/changes": "RSS feed of price changes (for n8n)",
+        "GET /feed/atom": "Atom feed of current prices",
+        "GET /vendors": "List available vendors",
+        "POST /cache/clear": "Clear price cache",
+    },
+    github="https://github.com/masfaiz-code/track-emas-api"
+).model_dump_json().encode()
+
+_VENDORS = get_available_vendors()
+VENDORS_BODY = VendorResponse(
+    success=True,
+    vendors=_VENDORS,
+    total=len(_VENDORS)
+).model_dump_json().encode()
 
 
 # ============================================================================
@@ -147,29 +483,7 @@ app.add_middleware(
 )
 async def get_info():
     """Get API information"""
-    return InfoResponse(
-        app_name="Lacak Emas API",
-        version="2.0.0",
-        status="running",
-        description="REST API untuk mendapatkan harga emas dari Galeri24 dengan tracking perubahan harga",
-        source="galeri24.co.id",
-        endpoints={
-            "GET /": "Interactive API documentation (Swagger)",
-            "GET /info": "API information",
-            "GET /health": "Health check",
-            "GET /prices": "Get gold prices with optional filters",
-            "GET /prices/changes": "Get price changes (up/down/stable)",
-            "GET /prices/history": "Get price history",
-            "GET /prices/trend": "Get trend summary",
-            "POST /prices/sync": "Sync prices to database",
-            "GET /feed/rss": "RSS feed of current prices",
-            "GET /feed/changes": "RSS feed of price changes (for n8n)",
-            "GET /feed/atom": "Atom feed of current prices",
-            "GET /vendors": "List available vendors",
-            "POST /cache/clear": "Clear price cache",
-        },
-        github="https://github.com/masfaiz-code/track-emas-api"
-    )
+    return Response(content=INFO_BODY, media_type="application/json")
 
 
 @app.get(
@@ -181,9 +495,9 @@ async def get_info():
 )
 async def health_check():
     """Health check endpoint"""
-    return HealthResponse(
-        status="healthy",
-        timestamp=datetime.now().isoformat()
+    return Response(
+        content=orjson.dumps({"status": "healthy", "timestamp": now_iso()}),
+        media_type="application/json"
     )
 
 
@@ -200,12 +514,7 @@ async def health_check():
 )
 async def get_vendors():
     """Get list of available gold vendors"""
-    vendors = get_available_vendors()
-    return VendorResponse(
-        success=True,
-        vendors=vendors,
-        total=len(vendors)
-    )
+    return Response(content=VENDORS_BODY, media_type="application/json")
 
 
 # ============================================================================
@@ -217,6 +526,7 @@ async def get_vendors():
     response_model=PriceResponse,
     responses={
         200: {"description": "Berhasil mendapatkan harga"},
+        304: {"description": "Data tidak berubah (ETag cocok dengan If-None-Match)"},
         500: {"model": ErrorResponse, "description": "Error saat scraping"},
     },
     tags=["Prices"],
@@ -241,6 +551,7 @@ Mendapatkan harga emas dari Galeri24.
     """
 )
 async def get_prices(
+    request: Request,
     vendor: Optional[str] = Query(
         None,
         description="Filter by vendor slug (antam, ubs, galeri24, dinar, baby)",
@@ -268,10 +579,15 @@ async def get_prices(
     try:
         # Scrape prices
         use_cache = not no_cache
-        prices = await scrape_galeri24(use_cache=use_cache, cache_ttl=CACHE_TTL)
+        prices = await coalesced_scrape(use_cache=use_cache, cache_ttl=CACHE_TTL)
         
-        # Apply filters
-        filtered_prices = filter_prices(
+        # Nothing scraped (upstream failing): skip filtering and the models
+        if not prices:
+            return Response(content=empty_price_body(use_cache), media_type="application/json")
+        
+        # Apply filters (memoized only for cached scrape results)
+        apply_filters = get_filtered_prices if use_cache else filter_prices
+        filtered_prices = apply_filters(
             prices,
             vendor=vendor,
             weight=weight,
@@ -279,19 +595,23 @@ async def get_prices(
             max_weight=max_weight,
         )
         
-        return PriceResponse(
-            success=True,
-            data=filtered_prices,
-            meta=MetaInfo(
-                source="galeri24.co.id",
-                scraped_at=datetime.now().isoformat(),
-                total=len(filtered_prices),
-                cached=use_cache,
-            )
-        )
+        data_json = GOLD_PRICE_LIST.dump_json(filtered_prices)
+        etag = compute_etag(data_json)
+        headers = {"ETag": etag}
+        if use_cache:
+            headers["Cache-Control"] = f"public, max-age={CACHE_TTL}"
+        
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        
+        # Reuse the serialized data array instead of building a PriceResponse
+        meta = {**_meta(len(filtered_prices)), "cached": use_cache}
+        body = b'{"success":true,"data":%b,"meta":%b,"error":null}' % (data_json, orjson.dumps(meta))
+        
+        return Response(content=body, media_type="application/json", headers=headers)
         
     except Exception as e:
-        logger.error(f"Error fetching prices: {e}")
+        logger.error("Error fetching prices: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -328,46 +648,32 @@ async def get_price_changes(
     if not SUPABASE_ENABLED:
         raise HTTPException(
             status_code=503,
-            detail="Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY."
+            detail=SUPABASE_DISABLED_DETAIL
         )
     
     try:
-        from database import get_price_changes, get_trend_summary
-        
-        changes = await get_price_changes(vendor=vendor, trend=trend)
-        summary = await get_trend_summary(days=1)
-        
-        # Convert to PriceChange models
-        change_list = [
-            PriceChange(
-                vendor=c["vendor"],
-                weight=float(c["weight"]),
-                previous_price=c.get("previous_price"),
-                current_price=c.get("current_price"),
-                change_amount=c.get("change_amount"),
-                change_percent=float(c["change_percent"]) if c.get("change_percent") else None,
-                trend=c.get("trend", "stable"),
-                price_date=c["price_date"],
-            )
-            for c in changes
-        ]
-        
-        return PriceChangeResponse(
-            success=True,
-            data=change_list,
-            summary=summary,
-            meta=MetaInfo(
-                source="galeri24.co.id",
-                scraped_at=datetime.now().isoformat(),
-                total=len(change_list),
-                cached=False,
-            )
+        # The summary is unfiltered and spans two days, so it can't be
+        # derived from `changes` - fetch both concurrently instead
+        changes, summary = await asyncio.gather(
+            fetch_price_changes(vendor=vendor, trend=trend),
+            get_trend_summary(days=1),
+        )
+        
+        # Rows already match PriceChange; coerce in place and skip the models
+        data = [_coerce_change(c) for c in changes]
+        
+        return Response(
+            content=orjson.dumps({
+                "success": True,
+                "data": data,
+                "summary": summary,
+                "meta": _meta(len(data)),
+            }),
+            media_type="application/json"
         )
         
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Database module not available")
     except Exception as e:
-        logger.error(f"Error getting price changes: {e}")
+        logger.error("Error getting price changes: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -386,6 +692,7 @@ Mendapatkan history harga emas untuk beberapa hari terakhir.
     """
 )
 async def get_history(
+    request: Request,
     vendor: Optional[str] = Query(None, description="Filter by vendor"),
     weight: Optional[float] = Query(None, description="Filter by weight in grams"),
     days: int = Query(7, ge=1, le=90, description="Number of days of history")
@@ -394,42 +701,33 @@ async def get_history(
     if not SUPABASE_ENABLED:
         raise HTTPException(
             status_code=503,
-            detail="Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY."
+            detail=SUPABASE_DISABLED_DETAIL
         )
     
     try:
-        from database import get_price_history
-        
         history = await get_price_history(vendor=vendor, weight=weight, days=days)
         
-        # Convert to models
-        history_list = [
-            PriceHistoryItem(
-                vendor=h["vendor"],
-                weight=float(h["weight"]),
-                selling_price=h.get("selling_price"),
-                buyback_price=h.get("buyback_price"),
-                price_date=h["price_date"],
-                source=h.get("source", "galeri24"),
-            )
-            for h in history
-        ]
-        
-        return PriceHistoryResponse(
-            success=True,
-            data=history_list,
-            meta=MetaInfo(
-                source="galeri24.co.id",
-                scraped_at=datetime.now().isoformat(),
-                total=len(history_list),
-                cached=False,
-            )
+        etag = compute_etag(orjson.dumps(history))
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={CACHE_TTL}"}
+        
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        
+        # Rows already match PriceHistoryItem; coerce in place and skip the models
+        data = [_coerce_history(h) for h in history]
+        
+        return Response(
+            content=orjson.dumps({
+                "success": True,
+                "data": data,
+                "meta": _meta(len(data)),
+            }),
+            media_type="application/json",
+            headers=headers
         )
         
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Database module not available")
     except Exception as e:
-        logger.error(f"Error getting price history: {e}")
+        logger.error("Error getting price history: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -447,35 +745,30 @@ async def get_trend(
     if not SUPABASE_ENABLED:
         raise HTTPException(
             status_code=503,
-            detail="Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY."
+            detail=SUPABASE_DISABLED_DETAIL
         )
     
     try:
-        from database import get_trend_summary
-        
         summary = await get_trend_summary(days=days)
+        total = summary.get("total", 0)
         
-        return TrendResponse(
-            success=True,
-            summary=TrendSummary(
-                up=summary.get("up", 0),
-                down=summary.get("down", 0),
-                stable=summary.get("stable", 0),
-                total=summary.get("total", 0),
-                period_days=days,
-            ),
-            meta=MetaInfo(
-                source="galeri24.co.id",
-                scraped_at=datetime.now().isoformat(),
-                total=summary.get("total", 0),
-                cached=False,
-            )
+        return Response(
+            content=orjson.dumps({
+                "success": True,
+                "summary": {
+                    "up": summary.get("up", 0),
+                    "down": summary.get("down", 0),
+                    "stable": summary.get("stable", 0),
+                    "total": total,
+                    "period_days": days,
+                },
+                "meta": _meta(total),
+            }),
+            media_type="application/json"
         )
         
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Database module not available")
     except Exception as e:
-        logger.error(f"Error getting trend: {e}")
+        logger.error("Error getting trend: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -496,41 +789,37 @@ async def sync_prices():
     if not SUPABASE_ENABLED:
         raise HTTPException(
             status_code=503,
-            detail="Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY."
+            detail=SUPABASE_DISABLED_DETAIL
         )
     
     try:
-        from database import save_prices
-        
         # Scrape fresh prices
-        prices = await scrape_galeri24(use_cache=False)
-        
-        # Convert to dict format
-        price_dicts = [
-            {
-                "vendor": p.vendor,
-                "weight": p.weight,
-                "selling_price": p.selling_price,
-                "buyback_price": p.buyback_price,
-            }
-            for p in prices
-        ]
-        
-        # Save to database
-        result = await save_prices(price_dicts)
-        
-        return SyncResponse(
-            success=True,
-            saved=result.get("saved", 0),
-            changes=result.get("changes", 0),
-            message=f"Synced {result.get('saved', 0)} prices, recorded {result.get('changes', 0)} changes",
-            timestamp=datetime.now().isoformat(),
+        prices = await coalesced_scrape(use_cache=False)
+        
+        # Save to database (depends on the scrape; save_prices itself runs
+        # the upsert and the previous-day lookup concurrently)
+        result = await save_prices(prices)
+        if "error" in result:
+            raise HTTPException(status_code=502, detail=result["error"])
+        
+        saved = result.get("saved", 0)
+        changes = result.get("changes", 0)
+        
+        return Response(
+            content=orjson.dumps({
+                "success": True,
+                "saved": saved,
+                "changes": changes,
+                "message": f"Synced {saved} prices, recorded {changes} changes",
+                "timestamp": now_iso(),
+            }),
+            media_type="application/json"
         )
         
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Database module not available")
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error syncing prices: {e}")
+        logger.error("Error syncing prices: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -566,7 +855,8 @@ RSS 2.0 feed untuk harga emas terkini.
         200: {
             "content": {"application/rss+xml": {}},
             "description": "RSS 2.0 feed"
-        }
+        },
+        304: {"description": "Feed tidak berubah (ETag cocok dengan If-None-Match)"},
     }
 )
 async def get_rss_feed(
@@ -576,46 +866,41 @@ async def get_rss_feed(
 ):
     """Get RSS feed of current gold prices"""
     try:
-        prices = await scrape_galeri24(use_cache=True, cache_ttl=CACHE_TTL)
-        
-        # Apply filters
-        filtered_prices = filter_prices(prices, vendor=vendor, weight=weight)
-        
-        # Convert to dict format for RSS generator
-        price_dicts = [
-            {
-                "vendor": p.vendor,
-                "weight": p.weight,
-                "selling_price": p.selling_price,
-                "buyback_price": p.buyback_price,
-                "date": p.date,
-            }
-            for p in filtered_prices
-        ]
+        prices = await coalesced_scrape(use_cache=True, cache_ttl=CACHE_TTL)
         
         # Build feed URL
-        feed_url = str(request.url)
-        
-        # Generate title based on filters
-        title = "Lacak Emas - Harga Emas Terkini"
-        if vendor:
-            title = f"Lacak Emas - Harga {vendor.upper()}"
-        
-        rss_xml = generate_rss_feed(
-            prices=price_dicts,
-            title=title,
-            description=f"Update harga emas harian dari Galeri24 ({len(price_dicts)} items)",
-            feed_url=feed_url,
-        )
+        feed_url = get_feed_url(request)
         
-        return Response(
-            content=rss_xml,
-            media_type="application/rss+xml",
-            headers={"X-Total-Items": str(len(price_dicts))}
-        )
+        # Rendered feeds are reused until the next scrape
+        cache_key = ("rss", get_scrape_generation(), vendor, weight, feed_url)
+        cached = _feed_cache.get(cache_key)
+        
+        if cached is None:
+            # Apply filters
+            filtered_prices = get_filtered_prices(prices, vendor=vendor, weight=weight)
+            
+            # Stream items straight into the feed generator
+            price_items = iter_feed_items(filtered_prices)
+            
+            # Generate title based on filters
+            title = "Lacak Emas - Harga Emas Terkini"
+            if vendor:
+                title = f"Lacak Emas - Harga {vendor.upper()}"
+            
+            rss_xml = generate_rss_feed(
+                prices=price_items,
+                title=title,
+                description=f"Update harga emas harian dari Galeri24 ({len(filtered_prices)} items)",
+                feed_url=feed_url,
+            )
+            
+            cached = build_feed_entry(rss_xml, len(filtered_prices))
+            _feed_cache[cache_key] = cached
+        
+        return feed_response(request, cached, "application/rss+xml")
         
     except Exception as e:
-        logger.error(f"Error generating RSS feed: {e}")
+        logger.error("Error generating RSS feed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -649,7 +934,8 @@ RSS feed untuk perubahan harga emas (naik/turun/stabil).
         200: {
             "content": {"application/rss+xml": {}},
             "description": "RSS 2.0 feed of price changes"
-        }
+        },
+        304: {"description": "Feed tidak berubah (ETag cocok dengan If-None-Match)"},
     }
 )
 async def get_changes_rss_feed(
@@ -661,40 +947,48 @@ async def get_changes_rss_feed(
     if not SUPABASE_ENABLED:
         raise HTTPException(
             status_code=503,
-            detail="Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY."
+            detail=SUPABASE_DISABLED_DETAIL
         )
     
     try:
-        from database import get_price_changes
+        changes = await fetch_price_changes(vendor=vendor, trend=trend)
         
-        changes = await get_price_changes(vendor=vendor, trend=trend)
+        # Polling readers get a 304 until the changes themselves differ
+        etag = compute_etag(orjson.dumps(changes))
+        if is_not_modified(request, etag):
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": FEED_CACHE_CONTROL}
+            )
         
-        feed_url = str(request.url)
+        feed_url = get_feed_url(request)
         
-        title = "Lacak Emas - Perubahan Harga"
-        if trend:
-            trend_text = {"up": "Naik", "down": "Turun", "stable": "Stabil"}.get(trend, trend)
-            title = f"Lacak Emas - Harga {trend_text}"
-        if vendor:
-            title += f" ({vendor.upper()})"
+        # Identical change rows render identical feeds, so reuse the XML
+        cache_key = ("changes", etag, feed_url)
+        cached = _feed_cache.get(cache_key)
         
-        rss_xml = generate_changes_rss_feed(
-            changes=changes,
-            title=title,
-            description=f"Notifikasi perubahan harga emas ({len(changes)} items)",
-            feed_url=feed_url,
-        )
+        if cached is None:
+            title = "Lacak Emas - Perubahan Harga"
+            if trend:
+                trend_text = {"up": "Naik", "down": "Turun", "stable": "Stabil"}.get(trend, trend)
+                title = f"Lacak Emas - Harga {trend_text}"
+            if vendor:
+                title += f" ({vendor.upper()})"
+            
+            rss_xml = generate_changes_rss_feed(
+                changes=changes,
+                title=title,
+                description=f"Notifikasi perubahan harga emas ({len(changes)} items)",
+                feed_url=feed_url,
+            )
+            
+            cached = build_feed_entry(rss_xml, len(changes), etag=etag)
+            _feed_cache[cache_key] = cached
         
-        return Response(
-            content=rss_xml,
-            media_type="application/rss+xml",
-            headers={"X-Total-Items": str(len(changes))}
-        )
+        return feed_response(request, cached, "application/rss+xml")
         
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Database module not available")
     except Exception as e:
-        logger.error(f"Error generating changes RSS feed: {e}")
+        logger.error("Error generating changes RSS feed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -715,7 +1009,8 @@ Beberapa feed reader lebih prefer format Atom.
         200: {
             "content": {"application/atom+xml": {}},
             "description": "Atom 1.0 feed"
-        }
+        },
+        304: {"description": "Feed tidak berubah (ETag cocok dengan If-None-Match)"},
     }
 )
 async def get_atom_feed(
@@ -725,46 +1020,40 @@ async def get_atom_feed(
 ):
     """Get Atom feed of current gold prices"""
     try:
-        prices = await scrape_galeri24(use_cache=True, cache_ttl=CACHE_TTL)
-        
-        # Apply filters
-        filtered_prices = filter_prices(prices, vendor=vendor, weight=weight)
-        
-        # Convert to dict format
-        price_dicts = [
-            {
-                "vendor": p.vendor,
-                "weight": p.weight,
-                "selling_price": p.selling_price,
-                "buyback_price": p.buyback_price,
-                "date": p.date,
-            }
-            for p in filtered_prices
-        ]
-        
-        feed_url = str(request.url)
-        base_url = str(request.base_url).rstrip("/")
-        
-        title = "Lacak Emas - Harga Emas Terkini"
-        if vendor:
-            title = f"Lacak Emas - Harga {vendor.upper()}"
-        
-        atom_xml = generate_atom_feed(
-            prices=price_dicts,
-            title=title,
-            subtitle=f"Update harga emas harian dari Galeri24 ({len(price_dicts)} items)",
-            feed_url=feed_url,
-            website_url="https://galeri24.co.id/harga-emas",
-        )
+        prices = await coalesced_scrape(use_cache=True, cache_ttl=CACHE_TTL)
         
-        return Response(
-            content=atom_xml,
-            media_type="application/atom+xml",
-            headers={"X-Total-Items": str(len(price_dicts))}
-        )
+        feed_url = get_feed_url(request)
+        
+        # Rendered feeds are reused until the next scrape
+        cache_key = ("atom", get_scrape_generation(), vendor, weight, feed_url)
+        cached = _feed_cache.get(cache_key)
+        
+        if cached is None:
+            # Apply filters
+            filtered_prices = get_filtered_prices(prices, vendor=vendor, weight=weight)
+            
+            # Stream items straight into the feed generator
+            price_items = iter_feed_items(filtered_prices)
+            
+            title = "Lacak Emas - Harga Emas Terkini"
+            if vendor:
+                title = f"Lacak Emas - Harga {vendor.upper()}"
+            
+            atom_xml = generate_atom_feed(
+                prices=price_items,
+                title=title,
+                subtitle=f"Update harga emas harian dari Galeri24 ({len(filtered_prices)} items)",
+                feed_url=feed_url,
+                website_url="https://galeri24.co.id/harga-emas",
+            )
+            
+            cached = build_feed_entry(atom_xml, len(filtered_prices))
+            _feed_cache[cache_key] = cached
+        
+        return feed_response(request, cached, "application/atom+xml")
         
     except Exception as e:
-        logger.error(f"Error generating Atom feed: {e}")
+        logger.error("Error generating Atom feed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -781,11 +1070,16 @@ async def get_atom_feed(
 async def clear_price_cache():
     """Clear the price cache"""
     clear_cache()
-    return {
-        "success": True,
-        "message": "Cache cleared successfully",
-        "timestamp": datetime.now().isoformat()
-    }
+    _filter_cache.clear()
+    _feed_cache.clear()
+    return Response(
+        content=orjson.dumps({
+            "success": True,
+            "message": "Cache cleared successfully",
+            "timestamp": now_iso()
+        }),
+        media_type="application/json"
+    )
 
 
 # ============================================================================
@@ -798,10 +1092,16 @@ if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000"))
     debug = os.getenv("DEBUG", "false").lower() == "true"
+    workers = int(os.getenv("WORKERS", "1"))
     
+    # Reload and multiple workers need an import string; otherwise serve
+    # this module's app instead of importing everything a second time as `main`.
+    # loop/http stay on "auto", which picks uvloop/httptools when installed
     uvicorn.run(
-        "main:app",
+        "main:app" if debug or workers > 1 else app,
         host=host,
         port=port,
         reload=debug,
+        workers=None if debug else workers,
+        access_log=debug,
     )
@@ -3,7 +3,7 @@ Pydantic models for Lacak Emas API
 """
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class GoldPrice(BaseModel):
@@ -16,8 +16,10 @@ class GoldPrice(BaseModel):
     price: Optional[int] = Field(None, description="Base price in IDR")
     date: str = Field(..., description="Price date (YYYY-MM-DD)")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        extra="ignore",
+        json_schema_extra={
             "example": {
                 "vendor": "ANTAM",
                 "weight": 1.0,
@@ -27,7 +29,13 @@ class GoldPrice(BaseModel):
                 "price": 1800000,
                 "date": "2026-02-03"
             }
-        }
+        },
+    )
+    
+    @classmethod
+    def from_trusted(cls, **data) -> "GoldPrice":
+        """Build without validation - only for internal-source data that already has the right types"""
+        return cls.model_construct(**data)
 
 
 class MetaInfo(BaseModel):
@@ -51,13 +59,16 @@ class VendorItem(BaseModel):
     name: str = Field(..., description="Vendor display name")
     slug: str = Field(..., description="Vendor slug for query parameter")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        extra="ignore",
+        json_schema_extra={
             "example": {
                 "name": "ANTAM",
                 "slug": "antam"
             }
-        }
+        },
+    )
 
 
 class VendorResponse(BaseModel):
@@ -106,8 +117,10 @@ class PriceChange(BaseModel):
     trend: str = Field(..., description="Price trend: up, down, or stable")
     price_date: str = Field(..., description="Date of the price")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        extra="ignore",
+        json_schema_extra={
             "example": {
                 "vendor": "ANTAM",
                 "weight": 1.0,
@@ -118,7 +131,8 @@ class PriceChange(BaseModel):
                 "trend": "up",
                 "price_date": "2026-02-04"
             }
-        }
+        },
+    )
 
 
 class PriceChangeResponse(BaseModel):
@@ -137,6 +151,8 @@ class PriceHistoryItem(BaseModel):
     buyback_price: Optional[int]
     price_date: str
     source: str = "galeri24"
+    
+    model_config = ConfigDict(frozen=True, extra="ignore")
 
 
 class PriceHistoryResponse(BaseModel):
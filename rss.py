@@ -5,20 +5,89 @@ Generates RSS/Atom feeds for gold price updates.
 Compatible with n8n RSS node and other feed readers.
 """
 from datetime import datetime, date, timedelta
-from typing import Optional
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from functools import lru_cache
+from typing import Iterable, Optional
+from xml.sax.saxutils import escape as _sax_escape
 
 
+ATOM_NS = "http://www.w3.org/2005/Atom"
+
+# Emoji and label per trend; unknown trends render as stable
+TREND_META = {
+    "up": ("📈", "NAIK"),
+    "down": ("📉", "TURUN"),
+    "stable": ("➡️", "STABIL"),
+}
+
+# Static feed boilerplate, built once at import
+_RSS_CHANNEL_PREFIX = f'<?xml version="1.0" ?><rss version="2.0" xmlns:atom="{ATOM_NS}"><channel>'
+_RSS_GENERATOR = "<generator>Lacak Emas API v2.0</generator>"
+_ATOM_FEED_PREFIX = f'<?xml version="1.0" ?><feed xmlns="{ATOM_NS}">'
+_ATOM_AUTHOR_GENERATOR = (
+    "<author><name>Lacak Emas API</name></author>"
+    '<generator version="2.0">Lacak Emas API</generator>'
+)
+
+# Quotes are escaped too, so the same helper is safe for attribute values
+_ESCAPE_ENTITIES = {'"': "&quot;"}
+
+
+def escape(value) -> str:
+    """Escape a value for use in XML text or a double-quoted attribute"""
+    return _sax_escape(str(value), _ESCAPE_ENTITIES)
+
+
+@lru_cache(maxsize=1024)
 def format_price(price: Optional[int]) -> str:
     """Format price to Indonesian Rupiah format"""
     if price is None:
         return "-"
-    return f"Rp {price:,}".replace(",", ".")
+    return f"Rp {price:_}".replace("_", ".")
+
+
+@lru_cache(maxsize=256)
+def _pub_date(price_date: str) -> str:
+    """RSS pubDate (09:00 WIB) for a YYYY-MM-DD date; raises ValueError if malformed"""
+    return date.fromisoformat(price_date).strftime("%a, %d %b %Y 09:00:00 +0700")
+
+
+@lru_cache(maxsize=256)
+def _atom_updated(price_date: str) -> str:
+    """Atom updated timestamp (09:00 WIB) for a YYYY-MM-DD date"""
+    return date.fromisoformat(price_date).strftime("%Y-%m-%dT09:00:00+07:00")
+
+
+@lru_cache(maxsize=32)
+def _build_channel_header(title: str, description: str, link: str, feed_url: str) -> tuple[str, str]:
+    """
+    Build the RSS channel header up to the first item.
+    
+    Returned as the text before and after the lastBuildDate value, which
+    is the only part that changes between calls.
+    """
+    head = "".join([
+        _RSS_CHANNEL_PREFIX,
+        # Channel metadata
+        f"<title>{escape(title)}</title>",
+        f"<description>{escape(description)}</description>",
+        f"<link>{escape(link)}</link>",
+        "<language>id</language>",
+        "<lastBuildDate>",
+    ])
+    tail = [
+        "</lastBuildDate>",
+        _RSS_GENERATOR,
+    ]
+    
+    # Self-referencing link (for Atom compatibility)
+    if feed_url:
+        tail.append(f'<atom:link href="{escape(feed_url)}" rel="self" type="application/rss+xml"/>')
+    
+    return head, "".join(tail)
 
 
 def generate_rss_feed(
-    prices: list[dict],
+    prices: Iterable[dict],
     title: str = "Lacak Emas - Harga Emas Terkini",
     description: str = "Update harga emas harian dari Galeri24",
     link: str = "https://galeri24.co.id/harga-emas",
@@ -28,85 +97,75 @@ def generate_rss_feed(
     Generate RSS 2.0 feed from price data.
     
     Args:
-        prices: List of price dicts with vendor, weight, selling_price, etc.
+        prices: Price dicts with vendor, weight, selling_price, etc. (iterated once)
         title: Feed title
         description: Feed description
         link: Website link
         feed_url: Self-referencing feed URL
-        
+    
     Returns:
         RSS XML string
     """
-    # Create root element
-    rss = ET.Element("rss", version="2.0")
-    rss.set("xmlns:atom", "http://www.w3.org/2005/Atom")
+    # Formatted once; used for lastBuildDate and as the fallback pubDate
+    now_pubdate = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0700")
     
-    channel = ET.SubElement(rss, "channel")
+    head, tail = _build_channel_header(title, description, link, feed_url)
+    parts = [head + now_pubdate + tail]
     
-    # Channel metadata
-    ET.SubElement(channel, "title").text = title
-    ET.SubElement(channel, "description").text = description
-    ET.SubElement(channel, "link").text = link
-    ET.SubElement(channel, "language").text = "id"
-    ET.SubElement(channel, "lastBuildDate").text = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0700")
-    ET.SubElement(channel, "generator").text = "Lacak Emas API v2.0"
-    
-    # Self-referencing link (for Atom compatibility)
-    if feed_url:
-        atom_link = ET.SubElement(channel, "{http://www.w3.org/2005/Atom}link")
-        atom_link.set("href", feed_url)
-        atom_link.set("rel", "self")
-        atom_link.set("type", "application/rss+xml")
+    # Loop-invariant lookups
+    append = parts.append
+    today_iso = date.today().isoformat()
     
     # Add items
     for price in prices:
-        item = ET.SubElement(channel, "item")
-        
         vendor = price.get("vendor", "Unknown")
         weight = price.get("weight", 0)
         selling_price = price.get("selling_price")
         buyback_price = price.get("buyback_price")
-        price_date = price.get("date") or price.get("price_date") or date.today().isoformat()
+        price_date = price.get("date") or price.get("price_date") or today_iso
         
-        # Title
-        ET.SubElement(item, "title").text = f"{vendor} {weight}g - {format_price(selling_price)}"
+        selling_fmt = format_price(selling_price)
+        buyback_fmt = format_price(buyback_price)
         
         # Description with details
         desc_parts = [
             f"<b>Vendor:</b> {vendor}",
             f"<b>Berat:</b> {weight} gram",
-            f"<b>Harga Jual:</b> {format_price(selling_price)}",
-            f"<b>Harga Buyback:</b> {format_price(buyback_price)}",
+            f"<b>Harga Jual:</b> {selling_fmt}",
+            f"<b>Harga Buyback:</b> {buyback_fmt}",
             f"<b>Tanggal:</b> {price_date}",
         ]
-        ET.SubElement(item, "description").text = "<br>".join(desc_parts)
-        
-        # Link (unique per item)
-        ET.SubElement(item, "link").text = f"{link}#{vendor.lower().replace(' ', '-')}-{weight}"
-        
-        # GUID (unique identifier)
-        guid = ET.SubElement(item, "guid")
-        guid.text = f"lacak-emas-{vendor}-{weight}-{price_date}"
-        guid.set("isPermaLink", "false")
+        description_html = "<br>".join(desc_parts)
+        item_title = f"{vendor} {weight}g - {selling_fmt}"
+        slug = vendor.lower().replace(" ", "-")
+        item_link = f"{link}#{slug}-{weight}"
+        guid = f"lacak-emas-{vendor}-{weight}-{price_date}"
         
         # Publication date
         try:
-            pub_date = datetime.strptime(price_date, "%Y-%m-%d")
-            ET.SubElement(item, "pubDate").text = pub_date.strftime("%a, %d %b %Y 09:00:00 +0700")
+            pub_date = _pub_date(price_date)
         except:
-            ET.SubElement(item, "pubDate").text = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0700")
+            pub_date = now_pubdate
         
-        # Category
-        ET.SubElement(item, "category").text = vendor
+        # One string per item; link and guid are unique per item
+        append(
+            "<item>"
+            f"<title>{escape(item_title)}</title>"
+            f"<description>{escape(description_html)}</description>"
+            f"<link>{escape(item_link)}</link>"
+            f'<guid isPermaLink="false">{escape(guid)}</guid>'
+            f"<pubDate>{pub_date}</pubDate>"
+            f"<category>{escape(vendor)}</category>"
+            "</item>"
+        )
     
-    # Convert to string with pretty printing
-    xml_str = ET.tostring(rss, encoding="unicode")
-    dom = minidom.parseString(xml_str)
-    return dom.toprettyxml(indent="  ", encoding=None)
+    parts.append("</channel>")
+    parts.append("</rss>")
+    return "".join(parts)
 
 
 def generate_changes_rss_feed(
-    changes: list[dict],
+    changes: Iterable[dict],
     title: str = "Lacak Emas - Perubahan Harga",
     description: str = "Notifikasi perubahan harga emas harian",
     link: str = "https://galeri24.co.id/harga-emas",
@@ -117,29 +176,18 @@ def generate_changes_rss_feed(
     
     This is ideal for n8n triggers - only new items when prices change.
     """
-    rss = ET.Element("rss", version="2.0")
-    rss.set("xmlns:atom", "http://www.w3.org/2005/Atom")
+    # Formatted once; used for lastBuildDate and as the fallback pubDate
+    now_pubdate = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0700")
     
-    channel = ET.SubElement(rss, "channel")
+    head, tail = _build_channel_header(title, description, link, feed_url)
+    parts = [head + now_pubdate + tail]
     
-    # Channel metadata
-    ET.SubElement(channel, "title").text = title
-    ET.SubElement(channel, "description").text = description
-    ET.SubElement(channel, "link").text = link
-    ET.SubElement(channel, "language").text = "id"
-    ET.SubElement(channel, "lastBuildDate").text = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0700")
-    ET.SubElement(channel, "generator").text = "Lacak Emas API v2.0"
-    
-    if feed_url:
-        atom_link = ET.SubElement(channel, "{http://www.w3.org/2005/Atom}link")
-        atom_link.set("href", feed_url)
-        atom_link.set("rel", "self")
-        atom_link.set("type", "application/rss+xml")
+    # Loop-invariant lookups
+    append = parts.append
+    today_iso = date.today().isoformat()
     
     # Add items for price changes
     for change in changes:
-        item = ET.SubElement(channel, "item")
-        
         vendor = change.get("vendor", "Unknown")
         weight = float(change.get("weight", 0))
         previous_price = change.get("previous_price")
@@ -147,26 +195,18 @@ def generate_changes_rss_feed(
         change_amount = change.get("change_amount", 0)
         change_percent = change.get("change_percent", 0)
         trend = change.get("trend", "stable")
-        price_date = change.get("price_date") or date.today().isoformat()
+        price_date = change.get("price_date") or today_iso
         
         # Trend emoji and text
-        if trend == "up":
-            trend_icon = "📈"
-            trend_text = "NAIK"
-        elif trend == "down":
-            trend_icon = "📉"
-            trend_text = "TURUN"
-        else:
-            trend_icon = "➡️"
-            trend_text = "STABIL"
+        trend_icon, trend_text = TREND_META.get(trend, TREND_META["stable"])
+        
+        change_fmt = format_price(change_amount)
+        sign = "+" if change_amount and change_amount > 0 else ""
         
         # Title with trend
         title_text = f"{trend_icon} {vendor} {weight}g {trend_text}"
         if change_amount:
-            sign = "+" if change_amount > 0 else ""
-            title_text += f" {sign}{format_price(change_amount)}"
-        
-        ET.SubElement(item, "title").text = title_text
+            title_text += f" {sign}{change_fmt}"
         
         # Detailed description
         desc_parts = [
@@ -174,34 +214,39 @@ def generate_changes_rss_feed(
             f"<b>Berat:</b> {weight} gram",
             f"<b>Harga Sebelumnya:</b> {format_price(previous_price)}",
             f"<b>Harga Sekarang:</b> {format_price(current_price)}",
-            f"<b>Perubahan:</b> {'+' if change_amount and change_amount > 0 else ''}{format_price(change_amount)} ({change_percent:+.2f}%)",
+            f"<b>Perubahan:</b> {sign}{change_fmt} ({change_percent:+.2f}%)",
             f"<b>Trend:</b> {trend_text}",
             f"<b>Tanggal:</b> {price_date}",
         ]
-        ET.SubElement(item, "description").text = "<br>".join(desc_parts)
-        
-        ET.SubElement(item, "link").text = f"{link}#{vendor.lower().replace(' ', '-')}-{weight}"
-        
-        guid = ET.SubElement(item, "guid")
-        guid.text = f"lacak-emas-change-{vendor}-{weight}-{price_date}"
-        guid.set("isPermaLink", "false")
+        description_html = "<br>".join(desc_parts)
+        slug = vendor.lower().replace(" ", "-")
+        item_link = f"{link}#{slug}-{weight}"
+        guid = f"lacak-emas-change-{vendor}-{weight}-{price_date}"
         
         try:
-            pub_date = datetime.strptime(price_date, "%Y-%m-%d")
-            ET.SubElement(item, "pubDate").text = pub_date.strftime("%a, %d %b %Y 09:00:00 +0700")
+            pub_date = _pub_date(price_date)
         except:
-            ET.SubElement(item, "pubDate").text = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0700")
+            pub_date = now_pubdate
         
-        ET.SubElement(item, "category").text = trend
-        ET.SubElement(item, "category").text = vendor
+        append(
+            "<item>"
+            f"<title>{escape(title_text)}</title>"
+            f"<description>{escape(description_html)}</description>"
+            f"<link>{escape(item_link)}</link>"
+            f'<guid isPermaLink="false">{escape(guid)}</guid>'
+            f"<pubDate>{pub_date}</pubDate>"
+            f"<category>{escape(trend)}</category>"
+            f"<category>{escape(vendor)}</category>"
+            "</item>"
+        )
     
-    xml_str = ET.tostring(rss, encoding="unicode")
-    dom = minidom.parseString(xml_str)
-    return dom.toprettyxml(indent="  ", encoding=None)
+    parts.append("</channel>")
+    parts.append("</rss>")
+    return "".join(parts)
 
 
 def generate_atom_feed(
-    prices: list[dict],
+    prices: Iterable[dict],
     title: str = "Lacak Emas - Harga Emas Terkini",
     subtitle: str = "Update harga emas harian dari Galeri24",
     feed_url: str = "",
@@ -211,70 +256,62 @@ def generate_atom_feed(
     Generate Atom 1.0 feed (alternative to RSS).
     Some feed readers prefer Atom format.
     """
-    # Atom namespace
-    ns = "http://www.w3.org/2005/Atom"
-    ET.register_namespace("", ns)
-    
-    feed = ET.Element(f"{{{ns}}}feed")
+    # Formatted once; used for the feed and as the fallback entry timestamp
+    now_updated = datetime.now().strftime("%Y-%m-%dT%H:%M:%S+07:00")
     
-    # Feed metadata
-    ET.SubElement(feed, f"{{{ns}}}title").text = title
-    ET.SubElement(feed, f"{{{ns}}}subtitle").text = subtitle
-    ET.SubElement(feed, f"{{{ns}}}id").text = feed_url or website_url
-    ET.SubElement(feed, f"{{{ns}}}updated").text = datetime.now().strftime("%Y-%m-%dT%H:%M:%S+07:00")
+    parts = [
+        _ATOM_FEED_PREFIX,
+        # Feed metadata
+        f"<title>{escape(title)}</title>",
+        f"<subtitle>{escape(subtitle)}</subtitle>",
+        f"<id>{escape(feed_url or website_url)}</id>",
+        f"<updated>{now_updated}</updated>",
+        # Links
+        f'<link href="{escape(feed_url)}" rel="self"/>',
+        f'<link href="{escape(website_url)}" rel="alternate"/>',
+        _ATOM_AUTHOR_GENERATOR,
+    ]
     
-    # Links
-    link_self = ET.SubElement(feed, f"{{{ns}}}link")
-    link_self.set("href", feed_url)
-    link_self.set("rel", "self")
-    
-    link_alt = ET.SubElement(feed, f"{{{ns}}}link")
-    link_alt.set("href", website_url)
-    link_alt.set("rel", "alternate")
-    
-    # Author
-    author = ET.SubElement(feed, f"{{{ns}}}author")
-    ET.SubElement(author, f"{{{ns}}}name").text = "Lacak Emas API"
-    
-    # Generator
-    generator = ET.SubElement(feed, f"{{{ns}}}generator")
-    generator.text = "Lacak Emas API"
-    generator.set("version", "2.0")
+    # Loop-invariant lookups
+    append = parts.append
+    today_iso = date.today().isoformat()
     
     # Entries
     for price in prices:
-        entry = ET.SubElement(feed, f"{{{ns}}}entry")
-        
         vendor = price.get("vendor", "Unknown")
         weight = price.get("weight", 0)
         selling_price = price.get("selling_price")
         buyback_price = price.get("buyback_price")
-        price_date = price.get("date") or price.get("price_date") or date.today().isoformat()
-        
-        ET.SubElement(entry, f"{{{ns}}}title").text = f"{vendor} {weight}g - {format_price(selling_price)}"
-        ET.SubElement(entry, f"{{{ns}}}id").text = f"lacak-emas-{vendor}-{weight}-{price_date}"
+        price_date = price.get("date") or price.get("price_date") or today_iso
         
         try:
-            updated = datetime.strptime(price_date, "%Y-%m-%d").strftime("%Y-%m-%dT09:00:00+07:00")
+            updated = _atom_updated(price_date)
         except:
-            updated = datetime.now().strftime("%Y-%m-%dT%H:%M:%S+07:00")
-        ET.SubElement(entry, f"{{{ns}}}updated").text = updated
+            updated = now_updated
         
-        link = ET.SubElement(entry, f"{{{ns}}}link")
-        link.set("href", f"{website_url}#{vendor.lower().replace(' ', '-')}-{weight}")
+        selling_fmt = format_price(selling_price)
         
-        content = ET.SubElement(entry, f"{{{ns}}}content")
-        content.set("type", "html")
-        content.text = f"""
+        content = f"""
         <p><b>Vendor:</b> {vendor}</p>
         <p><b>Berat:</b> {weight} gram</p>
-        <p><b>Harga Jual:</b> {format_price(selling_price)}</p>
+        <p><b>Harga Jual:</b> {selling_fmt}</p>
         <p><b>Harga Buyback:</b> {format_price(buyback_price)}</p>
         """
+        entry_title = f"{vendor} {weight}g - {selling_fmt}"
+        entry_id = f"lacak-emas-{vendor}-{weight}-{price_date}"
+        slug = vendor.lower().replace(" ", "-")
+        entry_link = f"{website_url}#{slug}-{weight}"
         
-        category = ET.SubElement(entry, f"{{{ns}}}category")
-        category.set("term", vendor)
+        append(
+            "<entry>"
+            f"<title>{escape(entry_title)}</title>"
+            f"<id>{escape(entry_id)}</id>"
+            f"<updated>{updated}</updated>"
+            f'<link href="{escape(entry_link)}"/>'
+            f'<content type="html">{escape(content)}</content>'
+            f'<category term="{escape(vendor)}"/>'
+            "</entry>"
+        )
     
-    xml_str = ET.tostring(feed, encoding="unicode")
-    dom = minidom.parseString(xml_str)
-    return dom.toprettyxml(indent="  ", encoding=None)
+    parts.append("</feed>")
+    return "".join(parts)
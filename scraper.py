@@ -4,20 +4,43 @@ Galeri24 Gold Price Scraper
 Scrapes gold prices from https://galeri24.co.id/harga-emas
 using the embedded __NUXT_DATA__ JSON.
 """
-import json
 import logging
 import re
+import time
+from bisect import bisect_left
 from datetime import datetime
-from typing import Optional, Any
-from cachetools import TTLCache
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
 import httpx
+import orjson
 
 from models import GoldPrice, VendorItem
 
 logger = logging.getLogger(__name__)
 
-# In-memory cache with TTL
-_cache: TTLCache = TTLCache(maxsize=100, ttl=300)  # 5 minutes default
+# In-memory cache for the one scraped price list, with its expiry
+# (time.monotonic() deadline) and TTL
+_cache_value: Optional[list[GoldPrice]] = None
+_cache_expires = 0.0
+_cache_ttl = 300  # 5 minutes default
+
+# Bumped whenever the cached price list is replaced or cleared, so callers
+# can key derived caches (filtered lists, rendered feeds) on it
+_scrape_generation = 0
+
+GALERI24_URL = "https://galeri24.co.id/harga-emas"
+
+# Browser-like headers sent with every page request
+GALERI24_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "id-ID,id;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Cache-Control": "no-cache",
+}
+
+# Shared HTTP client, reused so cache-miss scrapes skip the TCP/TLS handshake
+_http_client: Optional[httpx.AsyncClient] = None
 
 # Vendor slug mapping
 VENDOR_SLUGS = {
@@ -35,6 +58,23 @@ for slug, names in VENDOR_SLUGS.items():
     for name in names:
         VENDOR_NAME_TO_SLUG[name.upper()] = slug
 
+# Upper-cased vendor names per slug, for case-insensitive filtering
+_VENDOR_SLUGS_UPPER = {
+    slug: tuple(name.upper() for name in names)
+    for slug, names in VENDOR_SLUGS.items()
+}
+
+# Patterns used per element while parsing the payload
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_PRICE_RE = re.compile(r'^[\d,\.]+$')
+_DENOM_RE = re.compile(r'^(0?\.\d+|\d+\.?\d*)$')
+_VENDOR_RE = re.compile(r'ANTAM|UBS|GALERI|DINAR|BABY', re.IGNORECASE)
+
+# Keys of a serialized gold price object
+_GOLD_PRICE_FIELDS = frozenset({'id', 'price', 'sellingPrice', 'buybackPrice',
+                                'denomination', 'vendorName', 'date', 'status'})
+
 
 def get_vendor_slug(vendor_name: str) -> str:
     """Get slug from vendor name"""
@@ -42,16 +82,45 @@ def get_vendor_slug(vendor_name: str) -> str:
     return VENDOR_NAME_TO_SLUG.get(name_upper, name_upper.lower().replace(" ", ""))
 
 
+# Vendors listed by the API (VendorItem is frozen, so instances are shared)
+_AVAILABLE_VENDORS = (
+    VendorItem(name="ANTAM", slug="antam"),
+    VendorItem(name="UBS", slug="ubs"),
+    VendorItem(name="GALERI 24", slug="galeri24"),
+    VendorItem(name="DINAR G24", slug="dinar"),
+    VendorItem(name="BABY GALERI 24", slug="baby"),
+)
+
+
 def get_available_vendors() -> list[VendorItem]:
     """Return list of available vendors"""
-    vendors = [
-        VendorItem(name="ANTAM", slug="antam"),
-        VendorItem(name="UBS", slug="ubs"),
-        VendorItem(name="GALERI 24", slug="galeri24"),
-        VendorItem(name="DINAR G24", slug="dinar"),
-        VendorItem(name="BABY GALERI 24", slug="baby"),
-    ]
-    return vendors
+    return list(_AVAILABLE_VENDORS)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared Galeri24 HTTP client (created on first use)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            follow_redirects=True,
+            http2=True,
+            headers=GALERI24_HEADERS,
+            limits=httpx.Limits(
+                max_connections=10,
+                max_keepalive_connections=2,
+                keepalive_expiry=300,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared Galeri24 HTTP client"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 
 def parse_price(value: str | int | None) -> Optional[int]:
@@ -62,9 +131,13 @@ def parse_price(value: str | int | None) -> Optional[int]:
         return value
     if isinstance(value, float):
         return int(value)
+    text = value if type(value) is str else str(value)
+    # Plain digit strings (the common case) need no cleaning
+    if text.isdecimal():
+        return int(text)
     try:
         # Remove non-numeric characters except digits
-        cleaned = re.sub(r'[^\d]', '', str(value))
+        cleaned = _NON_DIGIT_RE.sub('', text)
         return int(cleaned) if cleaned else None
     except (ValueError, TypeError):
         return None
@@ -80,39 +153,7 @@ def parse_weight(value: str | float | None) -> Optional[float]:
         return None
 
 
-def resolve_nuxt_value(raw_data: list, index: int, visited: set = None) -> Any:
-    """
-    Resolve a value from Nuxt serialized data by following references.
-    
-    Nuxt 3 uses a special payload format where values can be references
-    to other indices in the array.
-    """
-    if visited is None:
-        visited = set()
-    
-    # Prevent infinite loops
-    if index in visited:
-        return None
-    visited.add(index)
-    
-    if index < 0 or index >= len(raw_data):
-        return None
-    
-    value = raw_data[index]
-    
-    # If it's a primitive, return as is
-    if isinstance(value, (str, bool, float)) or value is None:
-        return value
-    
-    # If it's an int, it might be an actual int or a reference
-    # We'll return it as-is since we can't know for sure
-    if isinstance(value, int):
-        return value
-    
-    return value
-
-
-def parse_nuxt_payload(html_content: str) -> list[dict]:
+def parse_nuxt_payload(html_content: bytes) -> list[dict]:
     """
     Parse Nuxt 3 payload format.
     
@@ -123,67 +164,57 @@ def parse_nuxt_payload(html_content: str) -> list[dict]:
     
     We need to find the goldPrice array and reconstruct the objects.
     """
-    pattern = r'<script[^>]*id="__NUXT_DATA__"[^>]*>(.*?)</script>'
-    match = re.search(pattern, html_content, re.DOTALL)
+    # Plain substring scans over the raw body: the payload is one script
+    # tag in a large page, and orjson parses the bytes without a decode
+    start = html_content.find(b'id="__NUXT_DATA__"')
+    gt = html_content.find(b'>', start) if start >= 0 else -1
+    end = html_content.find(b'</script>', gt) if gt >= 0 else -1
     
-    if not match:
+    if end < 0:
         logger.error("Could not find __NUXT_DATA__ in page")
         return []
     
     try:
-        raw_data = json.loads(match.group(1))
-    except json.JSONDecodeError as e:
+        raw_data = orjson.loads(html_content[gt + 1:end])
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse __NUXT_DATA__ JSON: {e}")
         return []
     
     logger.info(f"Raw data has {len(raw_data)} elements")
     
-    # Build a lookup of all string values for quick access
-    string_lookup = {}
+    # Classify every element in a single pass: strings are checked for
+    # dates and vendor names, dicts for the gold price object schema.
+    # Nuxt serializes objects with their values as references to other indices
     date_indices = []
     vendor_indices = []
+    gold_prices = []
+    size = len(raw_data)
     
     for i, item in enumerate(raw_data):
-        if isinstance(item, str):
-            string_lookup[i] = item
+        if type(item) is str:
             # Check for date pattern
-            if re.match(r'^\d{4}-\d{2}-\d{2}$', item):
+            if _DATE_RE.match(item):
                 date_indices.append(i)
             # Check for vendor names
-            if any(v in item.upper() for v in ['ANTAM', 'UBS', 'GALERI', 'DINAR', 'BABY']):
+            if _VENDOR_RE.search(item):
                 vendor_indices.append((i, item))
-    
-    logger.info(f"Found {len(vendor_indices)} vendor strings, {len(date_indices)} date strings")
-    
-    # Find the gold price objects by looking for dict patterns
-    # Nuxt serializes objects with their keys and values as references
-    gold_prices = []
-    
-    # Look for objects that have the gold price schema
-    gold_price_fields = {'id', 'price', 'sellingPrice', 'buybackPrice', 
-                         'denomination', 'vendorName', 'date', 'status'}
-    
-    for i, item in enumerate(raw_data):
-        if not isinstance(item, dict):
-            continue
-        
-        keys = set(item.keys())
-        matching_keys = keys & gold_price_fields
         
         # If this object has at least 4 gold price fields, try to resolve it
-        if len(matching_keys) >= 4:
+        elif type(item) is dict and len(item.keys() & _GOLD_PRICE_FIELDS) >= 4:
             resolved = {}
             for key, ref in item.items():
-                if isinstance(ref, int) and 0 <= ref < len(raw_data):
+                if isinstance(ref, int) and 0 <= ref < size:
                     resolved[key] = raw_data[ref]
                 else:
                     resolved[key] = ref
             
             # Validate that vendorName is a proper string
             vendor_name = resolved.get('vendorName')
-            if isinstance(vendor_name, str) and len(vendor_name) > 1:
+            if type(vendor_name) is str and len(vendor_name) > 1:
                 gold_prices.append(resolved)
     
+    logger.info(f"Found {len(vendor_indices)} vendor strings, {len(date_indices)} date strings")
+    
     if gold_prices:
         logger.info(f"Found {len(gold_prices)} gold price objects via dict parsing")
         return gold_prices
@@ -193,6 +224,12 @@ def parse_nuxt_payload(html_content: str) -> list[dict]:
     return parse_by_pattern_matching(raw_data, vendor_indices, date_indices)
 
 
+def _numeric_lead(text: str) -> bool:
+    """Whether text starts (after spaces) with a digit, comma or dot"""
+    lead = text.lstrip(' ')[:1]
+    return lead.isdecimal() or (lead != '' and lead in ',.')
+
+
 def parse_by_pattern_matching(raw_data: list, vendor_indices: list, date_indices: list) -> list[dict]:
     """
     Parse gold prices by finding patterns in the raw data.
@@ -206,63 +243,82 @@ def parse_by_pattern_matching(raw_data: list, vendor_indices: list, date_indices
     current_date = datetime.now().strftime('%Y-%m-%d')
     for idx in date_indices:
         date_val = raw_data[idx]
-        if isinstance(date_val, str):
+        if type(date_val) is str:
             current_date = date_val
             break
     
-    # For each vendor string, look for associated price data
-    for vendor_idx, vendor_name in vendor_indices:
-        if vendor_idx in used_vendors:
-            continue
-        
-        # Look for denomination patterns near this vendor
-        # Denominations are usually small numbers like 0.001, 0.5, 1, 5, 10, etc
-        search_start = max(0, vendor_idx - 30)
+    # Look for price and denomination strings near vendor strings.
+    # Vendor windows overlap, so each covered element is classified once
+    # into (index, value) candidates kept in index order.
+    # Denominations are usually small numbers like 0.001, 0.5, 1, 5, 10, etc
+    price_candidates = []
+    weight_candidates = []
+    covered_until = 0
+    
+    for vendor_idx in sorted(idx for idx, _ in vendor_indices):
+        search_start = max(covered_until, vendor_idx - 30)
         search_end = min(len(raw_data), vendor_idx + 30)
         
-        found_prices = []
-        
         for i in range(search_start, search_end):
             item = raw_data[i]
             
-            # Look for price-like strings (numeric with possible formatting)
-            if isinstance(item, str):
+            # Look for price-like strings (numeric with possible formatting).
+            # Both patterns need a digit, comma or dot first (spaces aside),
+            # so other text is skipped without running either regex
+            if type(item) is str and _numeric_lead(item):
                 # Check if it's a price (larger number)
-                price_match = re.match(r'^[\d,\.]+$', item.replace(' ', ''))
+                price_match = _PRICE_RE.match(item.replace(' ', ''))
                 if price_match:
                     try:
                         # Remove formatting
                         clean = item.replace(',', '').replace('.', '')
                         val = int(clean)
                         if 10000 <= val <= 100000000:  # Reasonable price range in IDR
-                            found_prices.append((i, val, 'price'))
+                            price_candidates.append((i, val))
                     except ValueError:
                         pass
                 
                 # Check if it's a denomination
-                denom_match = re.match(r'^(0?\.\d+|\d+\.?\d*)$', item)
+                denom_match = _DENOM_RE.match(item)
                 if denom_match:
                     try:
                         val = float(item)
                         if 0.001 <= val <= 1000:  # Reasonable weight range
-                            found_prices.append((i, val, 'weight'))
+                            weight_candidates.append((i, val))
                     except ValueError:
                         pass
         
-        # If we found both prices and weights, create entries
-        weights = [(i, v) for i, v, t in found_prices if t == 'weight']
-        prices = [(i, v) for i, v, t in found_prices if t == 'price']
+        covered_until = max(covered_until, search_end)
+    
+    price_positions = [i for i, _ in price_candidates]
+    weight_positions = [i for i, _ in weight_candidates]
+    
+    # For each vendor string, look for associated price data
+    for vendor_idx, vendor_name in vendor_indices:
+        if vendor_idx in used_vendors:
+            continue
         
+        # Candidates within 30 elements of this vendor
+        lo, hi = vendor_idx - 30, vendor_idx + 30
+        prices = price_candidates[bisect_left(price_positions, lo):bisect_left(price_positions, hi)]
+        weights = weight_candidates[bisect_left(weight_positions, lo):bisect_left(weight_positions, hi)]
+        
+        # If we found both prices and weights, create entries.
+        # Both lists are in index order, so one forward sweep finds the
+        # closest price to each weight (ties go to the earlier price)
+        j = 0
+        last = len(prices) - 1
         for weight_idx, weight in weights:
-            # Find the closest price to this weight
-            closest_price = None
-            min_distance = float('inf')
+            if not prices:
+                break
             
-            for price_idx, price in prices:
-                distance = abs(price_idx - weight_idx)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_price = price
+            while j < last and prices[j + 1][0] <= weight_idx:
+                j += 1
+            price_idx, closest_price = prices[j]
+            min_distance = abs(price_idx - weight_idx)
+            if j < last and prices[j + 1][0] - weight_idx < min_distance:
+                price_idx, closest_price = prices[j + 1]
+                min_distance = price_idx - weight_idx
             
             if closest_price and min_distance < 15:
                 gold_prices.append({
@@ -279,6 +335,14 @@ def parse_by_pattern_matching(raw_data: list, vendor_indices: list, date_indices
     return gold_prices
 
 
+# Only a handful of distinct vendor names exist, so each match is computed once
+@lru_cache(maxsize=256)
+def _vendor_matches(vendor_names: tuple[str, ...], vendor: str) -> bool:
+    """Whether a vendor name contains any of the upper-cased names"""
+    vendor_upper = vendor.upper()
+    return any(vn in vendor_upper for vn in vendor_names)
+
+
 def filter_prices(
     prices: list[GoldPrice],
     vendor: Optional[str] = None,
@@ -292,11 +356,8 @@ def filter_prices(
     if vendor:
         vendor_lower = vendor.lower().strip()
         # Get the vendor names that match this slug
-        vendor_names = VENDOR_SLUGS.get(vendor_lower, [vendor])
-        filtered = [
-            p for p in filtered 
-            if any(vn.upper() in p.vendor.upper() for vn in vendor_names)
-        ]
+        vendor_names = _VENDOR_SLUGS_UPPER.get(vendor_lower, (vendor.upper(),))
+        filtered = [p for p in filtered if _vendor_matches(vendor_names, p.vendor)]
     
     if weight is not None:
         # Allow small tolerance for float comparison
@@ -311,58 +372,11 @@ def filter_prices(
     return filtered
 
 
-async def scrape_galeri24(use_cache: bool = True, cache_ttl: int = 300) -> list[GoldPrice]:
-    """
-    Scrape gold prices from Galeri24.
-    
-    Args:
-        use_cache: Whether to use cached data if available
-        cache_ttl: Cache TTL in seconds (default 5 minutes)
-        
-    Returns:
-        List of GoldPrice objects
-    """
-    cache_key = "galeri24_prices"
-    
-    # Check cache first
-    if use_cache and cache_key in _cache:
-        logger.info("Returning cached data")
-        return _cache[cache_key]
-    
-    url = "https://galeri24.co.id/harga-emas"
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "id-ID,id;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-        "Cache-Control": "no-cache",
-    }
-    
-    try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            logger.info(f"Fetching {url}")
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            html_content = response.text
-            logger.info(f"Received {len(html_content)} bytes")
-            
-    except httpx.TimeoutException:
-        logger.error("Request timeout while fetching Galeri24")
-        raise Exception("Request timeout - Galeri24 tidak merespon")
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP error fetching Galeri24: {e}")
-        raise Exception(f"HTTP error: {e}")
+def iter_gold_prices(raw_prices: Iterable[dict]) -> Iterator[GoldPrice]:
+    """Yield a GoldPrice for each raw entry with a vendor, weight and at least one price"""
+    # Fallback date for entries without one, formatted once per scrape
+    today = datetime.now().strftime('%Y-%m-%d')
     
-    # Parse the __NUXT_DATA__
-    raw_prices = parse_nuxt_payload(html_content)
-    
-    logger.info(f"Found {len(raw_prices)} raw price entries")
-    
-    # Convert to GoldPrice models
-    gold_prices = []
     for item in raw_prices:
         try:
             vendor_name = item.get('vendorName')
@@ -388,9 +402,10 @@ async def scrape_galeri24(use_cache: bool = True, cache_ttl: int = 300) -> list[
             
             date_str = item.get('date')
             if not isinstance(date_str, str) or not date_str:
-                date_str = datetime.now().strftime('%Y-%m-%d')
+                date_str = today
             
-            price = GoldPrice(
+            # Every field was type-checked above, so skip re-validation
+            price = GoldPrice.from_trusted(
                 vendor=vendor_name,
                 weight=weight,
                 unit="gram",
@@ -399,43 +414,92 @@ async def scrape_galeri24(use_cache: bool = True, cache_ttl: int = 300) -> list[
                 price=base_price,
                 date=date_str,
             )
-            gold_prices.append(price)
+            yield price
             
         except Exception as e:
             logger.warning(f"Failed to parse price item: {e}")
             continue
+
+
+async def scrape_galeri24(use_cache: bool = True, cache_ttl: int = 300) -> list[GoldPrice]:
+    """
+    Scrape gold prices from Galeri24.
     
-    logger.info(f"Parsed {len(gold_prices)} valid gold prices")
+    Args:
+        use_cache: Whether to use cached data if available
+        cache_ttl: Cache TTL in seconds (default 5 minutes)
+        
+    Returns:
+        List of GoldPrice objects
+    """
+    global _cache_value, _cache_expires, _scrape_generation
     
-    # Remove duplicates (same vendor + weight)
-    seen = set()
-    unique_prices = []
-    for p in gold_prices:
-        key = (p.vendor, p.weight)
-        if key not in seen:
-            seen.add(key)
-            unique_prices.append(p)
+    # Check cache first
+    if use_cache and _cache_value is not None and time.monotonic() < _cache_expires:
+        logger.info("Returning cached data")
+        return _cache_value
     
-    gold_prices = unique_prices
+    url = GALERI24_URL
     
-    # Sort by vendor name and weight
-    gold_prices.sort(key=lambda x: (x.vendor, x.weight))
+    try:
+        logger.info(f"Fetching {url}")
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+        
+        html_content = response.content
+        logger.info(f"Received {len(html_content)} bytes")
+        
+    except httpx.TimeoutException:
+        logger.error("Request timeout while fetching Galeri24")
+        raise Exception("Request timeout - Galeri24 tidak merespon")
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP error fetching Galeri24: {e}")
+        raise Exception(f"HTTP error: {e}")
+    
+    # Parse the __NUXT_DATA__
+    raw_prices = parse_nuxt_payload(html_content)
+    
+    logger.info(f"Found {len(raw_prices)} raw price entries")
+    
+    # Convert to GoldPrice models and remove duplicates (same vendor + weight)
+    # as they are produced; setdefault keeps the first occurrence
+    unique = {}
+    parsed = 0
+    for price in iter_gold_prices(raw_prices):
+        parsed += 1
+        unique.setdefault((price.vendor, price.weight), price)
+    
+    logger.info(f"Parsed {parsed} valid gold prices")
+    
+    # Sort by vendor name and weight (keys are unique, so sort the keys)
+    gold_prices = [unique[key] for key in sorted(unique)]
     
     # Update cache
     if use_cache:
-        _cache[cache_key] = gold_prices
+        _cache_value = gold_prices
+        _cache_expires = time.monotonic() + _cache_ttl
+        _scrape_generation += 1
     
     return gold_prices
 
 
+def get_scrape_generation() -> int:
+    """Return the current generation of the cached price list"""
+    return _scrape_generation
+
+
 def clear_cache():
     """Clear the price cache"""
-    _cache.clear()
+    global _cache_value, _scrape_generation
+    _cache_value = None
+    _scrape_generation += 1
     logger.info("Cache cleared")
 
 
 def set_cache_ttl(ttl: int):
-    """Set cache TTL (creates new cache)"""
-    global _cache
-    _cache = TTLCache(maxsize=100, ttl=ttl)
+    """Set cache TTL (drops the cached prices)"""
+    global _cache_value, _cache_ttl, _scrape_generation
+    _cache_ttl = ttl
+    _cache_value = None
+    _scrape_generation += 1
     logger.info(f"Cache TTL set to {ttl} seconds")
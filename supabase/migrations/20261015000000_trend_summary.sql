@@ -0,0 +1,23 @@
+-- Trend summary aggregated in Postgres
+--
+-- Used by database.get_trend_summary() via POST /rest/v1/rpc/trend_summary
+-- so the API receives 4 counters instead of every price_changes row.
+-- The window start is passed in by the API (its own date minus N days),
+-- so it matches the other price_date filters rather than the database
+-- session's CURRENT_DATE.
+
+DROP FUNCTION IF EXISTS public.trend_summary(INT);
+
+CREATE OR REPLACE FUNCTION public.trend_summary(start_date DATE)
+RETURNS TABLE (up INT, down INT, stable INT, total INT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*) FILTER (WHERE trend = 'up')::INT AS up,
+        COUNT(*) FILTER (WHERE trend = 'down')::INT AS down,
+        COUNT(*) FILTER (WHERE trend = 'stable')::INT AS stable,
+        COUNT(*) FILTER (WHERE trend IN ('up', 'down', 'stable'))::INT AS total
+    FROM public.price_changes
+    WHERE price_date >= start_date;
+$$;
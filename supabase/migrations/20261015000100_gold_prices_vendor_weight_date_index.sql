@@ -0,0 +1,26 @@
+-- One row per vendor/weight/day
+--
+-- Turns the batched previous-day lookup in database.save_prices()
+-- (vendor + weight + price_date) into index probes instead of table scans,
+-- and is the conflict target of its upsert (on_conflict=vendor,weight,price_date).
+--
+-- Syncs used to insert a new row on every run, so keep only the most
+-- recent row per vendor/weight/day before adding the unique index.
+
+DELETE FROM public.gold_prices
+WHERE id IN (
+    SELECT id
+    FROM (
+        SELECT
+            id,
+            ROW_NUMBER() OVER (
+                PARTITION BY vendor, weight, price_date
+                ORDER BY created_at DESC NULLS LAST, id DESC
+            ) AS rn
+        FROM public.gold_prices
+    ) ranked
+    WHERE ranked.rn > 1
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_gold_prices_v_w_d
+    ON public.gold_prices (vendor, weight, price_date);